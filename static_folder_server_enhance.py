@@ -17,6 +17,11 @@
     FileService 类封装：所有逻辑（文件服务、索引更新、定时任务）都封装在 FileService 类中。
     单独进程运行：通过 multiprocessing.Process 启动服务，确保它与主流程独立运行。
     start() 方法启动服务：该方法启动 FastAPI 服务并处理所有的文件和目录访问, 不再单独写文件的路由函数。
+    多根目录挂载：通过 IndexShard 将多个目录挂载到不同 URL 前缀，每个分片独立索引、独立扫描和清理计划，互不阻塞；
+        ?search=关键字 可在所有分片的统一索引中搜索。
+    页缓存建议：下载和上传通过 io_advice 模块发出 posix_fadvise 建议，避免大文件传输挤掉热点小文件的页缓存。
+    流式上传：PUT 请求体按块流式写盘，支持预分配、按偏移断点续传，完成后原子重命名并立即写入索引；
+        需要 allow_upload=True 开启，默认不覆盖已有文件，覆盖时需带 overwrite=true。
 实现方案
     定时任务：使用 APScheduler 进行定时任务管理。
     增量和全量更新索引：通过参数 full_scan 来控制是否执行全量扫描。
@@ -68,46 +73,79 @@ stop_file_system_monitor 方法用于在服务关闭时停止文件系统监控
 import os
 import logging
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import time
 from multiprocessing import Process
 import mimetypes
-import io
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 import json
+import hashlib
+import html
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from email.utils import formatdate
+from urllib.parse import quote
+from io_advice import LARGE_FILE_THRESHOLD, fadvise, iter_file
 
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 上传相关配置
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 上传数据每累计 1MB 写一次盘
+UPLOAD_PART_SUFFIX = ".part"  # 未完成上传的临时文件后缀
+UPLOAD_STATE_SUFFIX = ".part.json"  # 记录已接收偏移的断点续传状态文件后缀
 
-class FileService:
-    def __init__(self, folder_path: str, host: str = "0.0.0.0", port: int = 8000):
+
+class IndexShard:
+    def __init__(self, folder_path: str, prefix: str = "", retention_days: int = 180,
+                 scan_schedule: dict = None, clean_schedule: dict = None):
         """
-        初始化静态文件服务器。
+        单个挂载根目录及其独立的索引分片。
 
-        :param folder_path: 要服务的文件夹路径。
-        :param host: 服务器绑定的主机地址，默认为 "0.0.0.0"。
-        :param port: 服务器监听的端口号，默认为 8000。
+        :param folder_path: 挂载的文件夹路径，索引保存在该目录下的 index.json。
+        :param prefix: 挂载的 URL 前缀，例如 "videos"，默认 "" 表示挂载在根路径。
+        :param retention_days: 文件保留天数，默认 180 天。
+        :param scan_schedule: 更新索引的 CronTrigger 参数，默认每天 0 点 5 分。
+        :param clean_schedule: 清理过期文件的 CronTrigger 参数，默认每天 0 点 0 分。
         """
         self.folder_path = os.path.abspath(folder_path)
         if not os.path.isdir(self.folder_path):
             raise ValueError(f"The path '{folder_path}' is not a valid directory.")
 
-        self.host = host
-        self.port = port
-        self.process = None
+        self.prefix = prefix.strip("/")
+        self.retention_days = retention_days
+        self.scan_schedule = scan_schedule or {"hour": 0, "minute": 5}
+        self.clean_schedule = clean_schedule or {"hour": 0, "minute": 0}
         self.logger = logging.getLogger(__name__)
 
-        # 初始化索引
+        # 保护 index 和 index.json：上传写入、扫描完成后的替换、保存索引都需要持有该锁
+        self.lock = threading.Lock()
+        self.active_scans = 0  # 正在进行的扫描数
+        self.added_during_scan = {}  # 扫描期间上传写入的条目，扫描完成替换索引时合并
+        self.removed_during_scan = set()  # 扫描期间清理删除的文件，扫描完成替换索引时移除
+
         self.index = self.load_index()
-        self.update_index(full_scan=True)  # 服务启动时进行全量更新
+
+    def __getstate__(self) -> dict:
+        """锁不能序列化，在子进程中重新创建"""
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
 
     def load_index(self) -> dict:
         """加载或初始化索引"""
@@ -119,49 +157,206 @@ class FileService:
             return {}
 
     def save_index(self):
-        """保存索引到文件"""
+        """保存索引到文件，先写临时文件再原子替换，避免读到写了一半的 index.json"""
         index_file = os.path.join(self.folder_path, "index.json")
-        with open(index_file, 'w', encoding='utf-8') as f:
-            json.dump(self.index, f, ensure_ascii=False, indent=4)
+        temp_file = index_file + ".tmp"
+        with self.lock:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.index, f, ensure_ascii=False, indent=4)
+            os.replace(temp_file, index_file)
+
+    def add_entry(self, file_path: str, entry: dict):
+        """写入单个文件的索引条目，如果正在扫描，扫描完成替换索引时会合并该条目"""
+        with self.lock:
+            self.index[file_path] = entry
+            if self.active_scans:
+                self.added_during_scan[file_path] = entry
+                self.removed_during_scan.discard(file_path)
+
+    def snapshot(self) -> dict:
+        """返回索引的副本，供其他线程安全遍历"""
+        with self.lock:
+            return dict(self.index)
 
     def update_index(self, full_scan: bool = False):
-        """更新索引，支持增量更新和全量更新"""
-        self.logger.info("Starting index update")
-        if full_scan:
-            self.logger.info("Performing full index scan")
-            self.index = {}
-            for root, _, files in os.walk(self.folder_path):
-                for file in files:
-                    file_path = os.path.relpath(os.path.join(root, file), self.folder_path)
-                    self.index[file_path] = {
-                        "last_modified": os.path.getmtime(os.path.join(root, file)),
-                        "size": os.path.getsize(os.path.join(root, file))
-                    }
-        else:
-            self.logger.info("Performing incremental index update")
-            for root, _, files in os.walk(self.folder_path):
-                for file in files:
-                    file_path = os.path.relpath(os.path.join(root, file), self.folder_path)
-                    if file_path not in self.index or os.path.getmtime(os.path.join(root, file)) > self.index[file_path]["last_modified"]:
-                        self.index[file_path] = {
-                            "last_modified": os.path.getmtime(os.path.join(root, file)),
-                            "size": os.path.getsize(os.path.join(root, file))
-                        }
+        """
+        更新索引，支持增量更新和全量更新。
+        扫描在新的字典上进行，完成后整体替换，扫描期间读者仍然看到旧的完整索引；
+        扫描期间上传写入的条目会在替换时合并进来，清理删除的文件会在替换时移除。
+        """
+        self.logger.info(f"Starting index update for /{self.prefix}")
+        with self.lock:
+            self.active_scans += 1
+            index = {} if full_scan else dict(self.index)
+        try:
+            self.scan(index, full_scan)
+            with self.lock:
+                index.update(self.added_during_scan)
+                for file_path in self.removed_during_scan:
+                    index.pop(file_path, None)
+                self.index = index
+        finally:
+            with self.lock:
+                self.active_scans -= 1
+                if not self.active_scans:
+                    self.added_during_scan.clear()
+                    self.removed_during_scan.clear()
 
         self.save_index()
 
+    def scan(self, index: dict, full_scan: bool):
+        """遍历文件夹，把新增和修改过的文件写入 index"""
+        if full_scan:
+            self.logger.info(f"Performing full index scan for /{self.prefix}")
+        else:
+            self.logger.info(f"Performing incremental index update for /{self.prefix}")
+        for root, _, files in os.walk(self.folder_path):
+            for file in files:
+                if file.endswith((UPLOAD_PART_SUFFIX, UPLOAD_STATE_SUFFIX)):
+                    continue  # 跳过未完成的上传
+                full_path = os.path.join(root, file)
+                file_path = os.path.relpath(full_path, self.folder_path)
+                try:
+                    last_modified = os.path.getmtime(full_path)
+                    if file_path in index and last_modified <= index[file_path]["last_modified"]:
+                        continue
+                    index[file_path] = {
+                        "last_modified": last_modified,
+                        "size": os.path.getsize(full_path)
+                    }
+                except FileNotFoundError:
+                    continue  # 列出目录之后文件被删除
+
     def clean_old_files(self):
-        """清理过期文件"""
-        threshold_date = datetime.now() - timedelta(days=180)
+        """清理过期文件，并从索引中移除"""
+        threshold_date = datetime.now() - timedelta(days=self.retention_days)
+        removed = []
         for root, _, files in os.walk(self.folder_path):
             for file in files:
                 full_path = os.path.join(root, file)
-                if os.path.getmtime(full_path) < threshold_date.timestamp():
-                    try:
-                        os.remove(full_path)
-                        self.logger.info(f"Deleted old file: {full_path}")
-                    except Exception as e:
-                        self.logger.error(f"Error deleting file {full_path}: {e}")
+                if file.endswith(UPLOAD_STATE_SUFFIX) and \
+                        os.path.exists(full_path[:-len(UPLOAD_STATE_SUFFIX)] + UPLOAD_PART_SUFFIX):
+                    continue  # 断点续传状态随对应的 .part 文件一起清理
+                try:
+                    if os.path.getmtime(full_path) >= threshold_date.timestamp():
+                        continue
+                    os.remove(full_path)
+                    self.logger.info(f"Deleted old file: {full_path}")
+                    if file.endswith(UPLOAD_PART_SUFFIX):
+                        # 过期的未完成上传，同时删除其断点续传状态
+                        state_file = full_path[:-len(UPLOAD_PART_SUFFIX)] + UPLOAD_STATE_SUFFIX
+                        if os.path.exists(state_file):
+                            os.remove(state_file)
+                        continue
+                    removed.append(os.path.relpath(full_path, self.folder_path))
+                except FileNotFoundError:
+                    continue  # 列出目录之后文件被删除
+                except Exception as e:
+                    self.logger.error(f"Error deleting file {full_path}: {e}")
+
+        if removed:
+            with self.lock:
+                for file_path in removed:
+                    self.index.pop(file_path, None)
+                    self.added_during_scan.pop(file_path, None)
+                    if self.active_scans:
+                        self.removed_during_scan.add(file_path)
+            self.save_index()
+
+    def url_path(self, file_path: str) -> str:
+        """将分片内的相对路径转换为 URL 路径"""
+        file_path = file_path.replace(os.sep, "/")
+        return f"{self.prefix}/{file_path}" if self.prefix else file_path
+
+
+class FileService:
+    def __init__(self, folder_path: str = None, host: str = "0.0.0.0", port: int = 8000, shards: list = None,
+                 io_advice: bool = True, allow_upload: bool = False):
+        """
+        初始化静态文件服务器。
+
+        :param folder_path: 要服务的文件夹路径，挂载在根路径；只挂载 shards 时可以省略。
+        :param host: 服务器绑定的主机地址，默认为 "0.0.0.0"。
+        :param port: 服务器监听的端口号，默认为 8000。
+        :param shards: 额外挂载的 IndexShard 列表，每个分片有独立的 URL 前缀、索引和扫描/清理计划。
+        :param io_advice: 是否对下载和上传发出 posix_fadvise 页缓存建议，默认开启，平台不支持时自动忽略。
+        :param allow_upload: 是否开启 PUT 上传。上传没有鉴权，默认关闭，只应在可信网络中开启。
+        """
+        shards = list(shards or [])
+        if folder_path is not None:
+            shards.insert(0, IndexShard(folder_path))
+        if not shards:
+            raise ValueError("At least one folder_path or shard is required.")
+
+        self.shards = {}
+        for shard in shards:
+            if shard.prefix in self.shards:
+                raise ValueError(f"Duplicate mount prefix: '/{shard.prefix}'")
+            self.shards[shard.prefix] = shard
+
+        # 根路径挂载的文件夹，兼容单目录用法
+        self.folder_path = self.shards[""].folder_path if "" in self.shards else None
+
+        self.host = host
+        self.port = port
+        self.io_advice = io_advice
+        self.allow_upload = allow_upload
+        self.process = None
+        self.logger = logging.getLogger(__name__)
+        self.active_uploads = set()  # 正在上传的文件，防止同一文件并发写入
+
+        # 初始化索引
+        self.update_index(full_scan=True)  # 服务启动时进行全量更新
+
+    @property
+    def index(self) -> dict:
+        """所有分片的统一索引视图，键为 URL 路径"""
+        index = {}
+        for shard in self.shards.values():
+            for file_path, entry in shard.snapshot().items():
+                index[shard.url_path(file_path)] = entry
+        return index
+
+    def run_on_shards(self, method: str, **kwargs):
+        """在各分片上并发执行同一个方法，单个分片出错不影响其他分片"""
+        with ThreadPoolExecutor(max_workers=len(self.shards)) as executor:
+            futures = {
+                executor.submit(getattr(shard, method), **kwargs): shard
+                for shard in self.shards.values()
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    self.logger.error(f"Error running {method} on /{futures[future].prefix}: {e}")
+
+    def update_index(self, full_scan: bool = False):
+        """并发更新所有分片的索引"""
+        self.run_on_shards("update_index", full_scan=full_scan)
+
+    def clean_old_files(self):
+        """并发清理所有分片的过期文件"""
+        self.run_on_shards("clean_old_files")
+
+    def find_shard(self, url_path: str):
+        """
+        按最长前缀匹配 URL 路径所在的分片。
+        :param url_path: 去掉首尾 "/" 的 URL 路径。
+        :return: (分片, 分片内相对路径)，没有匹配的分片时返回 None。
+        """
+        for prefix in sorted(self.shards, key=len, reverse=True):
+            if not prefix or url_path == prefix or url_path.startswith(prefix + "/"):
+                return self.shards[prefix], url_path[len(prefix):].lstrip("/")
+        return None
+
+    def mount_points(self, url_path: str) -> list:
+        """返回 url_path 下一级的分片挂载目录名，包括嵌套前缀的中间目录"""
+        scope = url_path + "/" if url_path else ""
+        return sorted({
+            prefix[len(scope):].split("/", 1)[0]
+            for prefix in self.shards
+            if prefix and prefix.startswith(scope)
+        })
 
     def create_app(self) -> FastAPI:
         """
@@ -189,21 +384,40 @@ class FileService:
             """
             提供对文件和文件夹的访问：
             - 如果是文件，则返回文件内容。
-            - 如果是文件夹，则返回文件夹内文件的 HTML 列表。
+            - 如果是文件夹，则返回文件夹内文件的 HTML 列表，挂载在该路径下的分片也会列出。
+            - 如果带有 search 参数，则在所有分片的索引中搜索该路径下文件名包含关键字的文件。
             """
             self.logger.info(f"Handling request for path: {file_path}")
+            file_path = file_path.strip("/")
+
+            # 跨分片搜索
+            keyword = request.query_params.get('search')
+            if keyword:
+                return await self.render_search(file_path, keyword)
+
+            # 找到路径所在的分片
+            match = self.find_shard(file_path)
+            if match is None:
+                # 没有根目录挂载时，分片前缀的上级路径是虚拟目录
+                if not file_path or self.mount_points(file_path):
+                    return await self.render_directory(None, file_path)
+                self.logger.warning(f"Path not found: {file_path}")
+                raise HTTPException(status_code=404, detail="File or directory not found")
+            shard, shard_path = match
 
             # 拼接文件或文件夹的完整路径
-            full_path = os.path.abspath(os.path.join(self.folder_path, file_path))
+            full_path = os.path.abspath(os.path.join(shard.folder_path, shard_path))
             self.logger.info(f"Full path: {full_path}")
 
             # 确保路径在指定文件夹范围内
-            if not os.path.commonpath([full_path, self.folder_path]) == self.folder_path:
+            if not os.path.commonpath([full_path, shard.folder_path]) == shard.folder_path:
                 self.logger.warning(f"Access denied for path: {full_path}")
                 raise HTTPException(status_code=403, detail="Access denied")
 
-            # 路径不存在
+            # 路径不存在，但可能是嵌套分片前缀的中间目录
             if not os.path.exists(full_path):
+                if self.mount_points(file_path):
+                    return await self.render_directory(None, file_path)
                 self.logger.warning(f"Path not found: {full_path}")
                 raise HTTPException(status_code=404, detail="File or directory not found")
 
@@ -221,8 +435,205 @@ class FileService:
             self.logger.error(f"Invalid path: {full_path}")
             raise HTTPException(status_code=404, detail="Invalid path")
 
+        # 上传默认关闭，不注册 PUT 路由时请求返回 405
+        if self.allow_upload:
+            @app.put("/{file_path:path}")
+            async def upload_path(file_path: str, request: Request):
+                """
+                流式上传文件，支持断点续传：
+                - offset：本次请求体在文件中的起始偏移，默认 0；与服务端已接收的偏移不一致时返回 409 和当前偏移。
+                - size：文件总大小，可选。提供时预分配磁盘空间，收满 size 字节才完成上传；
+                  不提供时，请求体正常结束即视为上传完成。连接中断时只保存进度，不会完成上传。
+                - overwrite：目标文件已存在时是否覆盖，默认不覆盖并返回 409。
+                上传完成后原子重命名为目标文件，并立即写入索引。
+                """
+                self.logger.info(f"Handling upload for path: {file_path}")
+
+                # 找到路径所在的分片
+                match = self.find_shard(file_path.strip("/"))
+                if match is None:
+                    raise HTTPException(status_code=404, detail="No folder mounted at this path")
+                shard, shard_path = match
+
+                full_path = os.path.abspath(os.path.join(shard.folder_path, shard_path))
+
+                # 确保路径在指定文件夹范围内
+                if not os.path.commonpath([full_path, shard.folder_path]) == shard.folder_path:
+                    self.logger.warning(f"Upload denied for path: {full_path}")
+                    raise HTTPException(status_code=403, detail="Access denied")
+
+                # 索引文件和上传临时文件不允许被覆盖
+                if full_path == os.path.join(shard.folder_path, "index.json") or \
+                        full_path.endswith((UPLOAD_PART_SUFFIX, UPLOAD_STATE_SUFFIX)):
+                    raise HTTPException(status_code=403, detail="Reserved file name")
+
+                if os.path.isdir(full_path):
+                    raise HTTPException(status_code=409, detail="Path is a directory")
+
+                overwrite = request.query_params.get('overwrite', '').lower() == 'true'
+                if os.path.exists(full_path) and not overwrite:
+                    raise HTTPException(status_code=409, detail="File already exists")
+
+                try:
+                    offset = int(request.query_params.get('offset', 0))
+                    size = request.query_params.get('size')
+                    size = int(size) if size else None
+                except ValueError:
+                    raise HTTPException(status_code=400, detail="Invalid offset or size")
+                if offset < 0 or (size is not None and not 0 <= offset <= size):
+                    raise HTTPException(status_code=400, detail="Invalid offset or size")
+
+                if full_path in self.active_uploads:
+                    raise HTTPException(status_code=409, detail="Upload already in progress")
+
+                self.active_uploads.add(full_path)
+                try:
+                    return await self.receive_upload(shard, full_path, request, offset, size, overwrite)
+                finally:
+                    self.active_uploads.discard(full_path)
+
         return app  # 返回 FastAPI 应用程序实例
 
+    async def receive_upload(self, shard: IndexShard, full_path: str, request: Request, offset: int,
+                             size: int = None, overwrite: bool = False) -> JSONResponse:
+        """
+        将请求体按块流式写入临时文件，收齐后原子重命名为目标文件并更新所在分片的索引。
+        :param shard: 文件所在的分片。
+        :param full_path: 目标文件的完整路径。
+        :param request: 请求对象。
+        :param offset: 本次请求体的起始偏移。
+        :param size: 文件总大小，未知时为 None。
+        :param overwrite: 目标文件已存在时是否覆盖。
+        :return: 上传完成返回 201，未完成返回 202 和已接收的偏移，上传期间目标文件被创建且不覆盖时返回 409。
+        """
+        part_path = full_path + UPLOAD_PART_SUFFIX
+        state = self.load_upload_state(full_path) if os.path.exists(part_path) else {}
+        received = state.get("offset", 0)
+
+        if offset != 0:
+            # 续传时偏移和文件大小都必须与已接收的状态一致
+            size = state.get("size") if size is None else size
+            if offset != received or size != state.get("size"):
+                raise HTTPException(
+                    status_code=409,
+                    detail={"message": "Upload offset mismatch", "offset": received},
+                    headers={"Upload-Offset": str(received)},
+                )
+
+        flags = os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0)
+        if offset == 0:
+            flags |= os.O_TRUNC  # 从头上传时丢弃旧的临时文件
+        try:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            fd = os.open(part_path, flags, 0o644)
+        except OSError as e:
+            # 上级路径中有同名文件、没有写权限等
+            self.logger.error(f"Cannot create upload file {part_path}: {e}")
+            raise HTTPException(status_code=409, detail="Cannot create file at this path")
+
+        position = offset
+        buffer = bytearray()
+        completed = False
+        disconnected = False
+        try:
+            if offset == 0 and size:
+                self.preallocate(fd, size)
+            os.lseek(fd, offset, os.SEEK_SET)
+
+            try:
+                async for chunk in request.stream():
+                    if size is not None and position + len(buffer) + len(chunk) > size:
+                        raise HTTPException(status_code=413, detail="Upload exceeds declared size")
+                    buffer.extend(chunk)
+                    if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                        position += await run_in_threadpool(self.write_chunk, fd, buffer)
+                        buffer.clear()
+            except ClientDisconnect:
+                # 连接中断时只保存已收到的数据，不论是否知道文件大小都不能完成上传
+                disconnected = True
+                self.logger.warning(f"Client disconnected during upload: {full_path}")
+
+            if buffer:
+                position += await run_in_threadpool(self.write_chunk, fd, buffer)
+                buffer.clear()
+
+            completed = not disconnected and (size is None or position == size)
+            if completed:
+                os.ftruncate(fd, position)
+                await run_in_threadpool(os.fsync, fd)
+                if self.io_advice and position >= LARGE_FILE_THRESHOLD:
+                    fadvise(fd, 0, 0, "DONTNEED")  # 大文件已落盘，释放其页缓存
+        finally:
+            os.close(fd)
+            if not completed:
+                self.save_upload_state(full_path, {"offset": position, "size": size})
+
+        if not completed:
+            self.logger.info(f"Upload paused at offset {position}: {full_path}")
+            return JSONResponse(
+                {"offset": position, "size": size},
+                status_code=202,
+                headers={"Upload-Offset": str(position)},
+            )
+
+        # 上传期间目标文件被创建：保留已收齐的数据，客户端可以带 overwrite=true 从当前偏移重新提交
+        if os.path.exists(full_path) and not overwrite:
+            self.save_upload_state(full_path, {"offset": position, "size": size})
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "File already exists", "offset": position},
+                headers={"Upload-Offset": str(position)},
+            )
+
+        # 原子重命名，读者只会看到完整的文件
+        os.replace(part_path, full_path)
+        if os.path.exists(full_path + UPLOAD_STATE_SUFFIX):
+            os.remove(full_path + UPLOAD_STATE_SUFFIX)
+
+        file_path = os.path.relpath(full_path, shard.folder_path)
+        entry = {
+            "last_modified": os.path.getmtime(full_path),
+            "size": os.path.getsize(full_path)
+        }
+        # 索引锁可能正被扫描线程持有，不在事件循环中等待
+        await run_in_threadpool(shard.add_entry, file_path, entry)
+        await run_in_threadpool(shard.save_index)
+        self.logger.info(f"Upload completed: {full_path}")
+
+        return JSONResponse({"path": shard.url_path(file_path), "size": position}, status_code=201)
+
+    def write_chunk(self, fd: int, data: bytes) -> int:
+        """将数据完整写入文件描述符，返回写入的字节数"""
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+        return len(data)
+
+    def preallocate(self, fd: int, size: int):
+        """已知文件大小时预分配磁盘空间，平台或文件系统不支持时忽略"""
+        if not hasattr(os, "posix_fallocate"):
+            return
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError as e:
+            self.logger.warning(f"Preallocation not supported: {e}")
+
+    def load_upload_state(self, full_path: str) -> dict:
+        """读取断点续传状态"""
+        state_file = full_path + UPLOAD_STATE_SUFFIX
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_upload_state(self, full_path: str, state: dict):
+        """保存断点续传状态"""
+        state_file = full_path + UPLOAD_STATE_SUFFIX
+        with open(state_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+
     async def serve_file(self, full_path: str, request: Request) -> FileResponse:
         """
         处理文件请求，返回文件内容。
@@ -261,6 +672,15 @@ class FileService:
                     "Content-Disposition": f"{content_disposition}; filename={os.path.basename(full_path)}",
                 }
 
+                if self.io_advice:
+                    # 先打开文件，文件不存在等错误在发送响应头之前就能处理
+                    file = open(full_path, 'rb')
+                    try:
+                        return self.advised_file_response(file, mime_type, request, headers)
+                    except Exception:
+                        file.close()
+                        raise
+
                 return FileResponse(
                     full_path,
                     headers=headers
@@ -271,8 +691,14 @@ class FileService:
 
     async def range_file_response(self, full_path: str, range_header: str) -> StreamingResponse:
         """处理 MP4 文件的范围请求"""
-        file_size = os.path.getsize(full_path)
-        start, end = self.parse_range_header(range_header, file_size)
+        # 先打开文件并取得大小，之后删除或截断文件不会影响已经发出的响应头
+        file = open(full_path, 'rb')
+        try:
+            file_size = os.fstat(file.fileno()).st_size
+            start, end = self.parse_range_header(range_header, file_size)
+        except Exception:
+            file.close()
+            raise
         length = end - start + 1
 
         headers = {
@@ -282,11 +708,74 @@ class FileService:
             'Content-Length': str(length),
         }
 
-        with open(full_path, 'rb') as file:
-            file.seek(start)
-            content = file.read(length)
+        # 分块读取范围内容，拖动播放可能重复读取同一范围，因此不释放页缓存
+        content = iter_file(file, start, length, 'video/mp4', advise=self.io_advice, drop_cache=False)
 
-        return StreamingResponse(io.BytesIO(content), status_code=206, headers=headers)
+        # 响应没有读取内容（例如 HEAD 请求）时也要关闭文件
+        return StreamingResponse(content, status_code=206, headers=headers, background=BackgroundTask(file.close))
+
+    def advised_file_response(self, file, mime_type: str, request: Request, headers: dict) -> Response:
+        """
+        从已打开的文件分块读取并发出 fadvise 建议。
+        Range、If-Range、ETag 和 Last-Modified 在这里处理，与 FileResponse 的行为保持一致，
+        不依赖 FileResponse 的内部方法。
+        :param file: 已以二进制模式打开的文件，响应结束后关闭。
+        :param mime_type: 文件的 MIME 类型。
+        :param request: 请求对象。
+        :param headers: 响应头。
+        :return: 200 完整内容、206 范围内容或 416。
+        """
+        stat_result = os.fstat(file.fileno())
+        file_size = stat_result.st_size
+        last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+        etag_base = f"{stat_result.st_mtime}-{file_size}"
+        etag = f'"{hashlib.md5(etag_base.encode(), usedforsecurity=False).hexdigest()}"'  # 与 FileResponse 相同
+        headers = dict(headers, **{"Accept-Ranges": "bytes", "ETag": etag, "Last-Modified": last_modified})
+
+        start, end, status_code = 0, file_size - 1, 200
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        # If-Range 与当前文件不一致时忽略 Range，返回完整内容
+        if range_header and if_range in (None, etag, last_modified):
+            byte_range = self.parse_byte_range(range_header, file_size)
+            if byte_range is not None:
+                start, end = byte_range
+                if start >= file_size:
+                    file.close()
+                    return Response(status_code=416, headers={"Content-Range": f"bytes */{file_size}"})
+                status_code = 206
+                headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+
+        length = end - start + 1
+        headers["Content-Length"] = str(length)
+        # 只有完整下载大文件时才在结束后释放页缓存，断点续传可能还会读取同一范围
+        content = iter_file(file, start, length, mime_type,
+                            drop_cache=status_code == 200 and length >= LARGE_FILE_THRESHOLD)
+
+        # 响应没有读取内容时也要关闭文件
+        return StreamingResponse(content, status_code=status_code, headers=headers,
+                                 background=BackgroundTask(file.close))
+
+    def parse_byte_range(self, range_header: str, file_size: int):
+        """
+        解析单段 Range 请求头，支持 "bytes=a-b"、"bytes=a-" 和 "bytes=-n"。
+        :return: (start, end)；多段或格式错误时返回 None，表示忽略 Range 返回完整内容。
+        """
+        unit, _, byte_range = range_header.partition('=')
+        if unit.strip().lower() != 'bytes' or ',' in byte_range:
+            return None
+        start, _, end = byte_range.strip().partition('-')
+        try:
+            if not start:
+                suffix = int(end)
+                return (max(file_size - suffix, 0), file_size - 1) if suffix > 0 else None
+            start = int(start)
+            end = min(int(end), file_size - 1) if end else file_size - 1
+        except ValueError:
+            return None
+        if start < 0 or (start < file_size and end < start):
+            return None
+        return start, end
 
     def parse_range_header(self, range_header: str, file_size: int) -> (int, int):
         """解析 Range 请求头"""
@@ -298,29 +787,70 @@ class FileService:
         return start, end
 
     async def render_directory(self, full_path: str, file_path: str) -> HTMLResponse:
-        """渲染文件夹内容为 HTML 页面"""
+        """渲染文件夹内容为 HTML 页面，full_path 为 None 时只列出挂载在该路径下的分片"""
         self.logger.info(f"Rendering directory: {full_path}")
 
-        files = sorted(os.listdir(full_path))
+        mounts = self.mount_points(file_path)
+        files = sorted(set(os.listdir(full_path) if full_path else []) | set(mounts))
+
+        def href(path: str) -> str:
+            """文件名可能来自上传，链接需要 URL 编码并转义"""
+            return html.escape(quote(path))
+
         files_html = "\n".join([
-            f'<li><a href="/{os.path.join(file_path, f)}" download="{f}">{f}</a> '
-            f'<a href="/{os.path.join(file_path, f)}?view=true">[查看]</a></li>'
-            if os.path.isfile(os.path.join(full_path, f)) and (f.lower().endswith(('.jpg', '.png', '.mp4'))) else
-            f'<li><a href="/{os.path.join(file_path, f)}">{f}</a></li>'
+            f'<li><a href="/{href(os.path.join(file_path, f))}" download="{html.escape(f)}">{html.escape(f)}</a> '
+            f'<a href="/{href(os.path.join(file_path, f))}?view=true">[查看]</a></li>'
+            if f not in mounts and os.path.isfile(os.path.join(full_path, f)) and (f.lower().endswith(('.jpg', '.png', '.mp4'))) else
+            f'<li><a href="/{href(os.path.join(file_path, f))}">{html.escape(f)}</a></li>'
             for f in files
         ])
 
         # 添加返回上一级目录的链接（如果不是根目录）
         if file_path:
             parent_dir = os.path.dirname(file_path)
-            files_html = f'<li><a href="/{parent_dir if parent_dir != "." else ""}">../</a></li>\n' + files_html
+            files_html = f'<li><a href="/{href(parent_dir if parent_dir != "." else "")}">../</a></li>\n' + files_html
+
+        return HTMLResponse(
+            content=f"""
+            <html>
+            <head><title>Index of /{html.escape(file_path)}</title></head>
+            <body>
+                <h1>Index of /{html.escape(file_path)}</h1>
+                <ul>
+                    {files_html}
+                </ul>
+            </body>
+            </html>
+            """,
+            status_code=200,
+        )
+
+    async def render_search(self, file_path: str, keyword: str) -> HTMLResponse:
+        """在所有分片的索引中搜索 file_path 下文件名包含关键字的文件，渲染为 HTML 页面"""
+        self.logger.info(f"Searching '{keyword}' under /{file_path}")
+
+        keyword = keyword.lower()
+        title = html.escape(keyword)
+        scope = file_path + "/" if file_path else ""
+        index = await run_in_threadpool(lambda: self.index)
+        results = sorted(
+            url_path for url_path in index
+            if url_path.startswith(scope) and keyword in posixpath.basename(url_path).lower()
+        )
+        # 文件名可能来自上传，链接和文本都需要转义
+        files_html = "\n".join([
+            f'<li><a href="/{html.escape(quote(url_path))}" download="{html.escape(posixpath.basename(url_path))}">'
+            f'{html.escape(url_path)}</a></li>'
+            for url_path in results
+        ])
 
         return HTMLResponse(
             content=f"""
             <html>
-            <head><title>Index of /{file_path}</title></head>
+            <head><title>Search "{title}" in /{html.escape(file_path)}</title></head>
             <body>
-                <h1>Index of /{file_path}</h1>
+                <h1>Search "{title}" in /{html.escape(file_path)}</h1>
+                <p><a href="/{html.escape(quote(file_path))}">返回目录</a>，共 {len(results)} 个结果</p>
                 <ul>
                     {files_html}
                 </ul>
@@ -336,10 +866,15 @@ class FileService:
         config = uvicorn.Config(app, host=self.host, port=self.port, log_level="info")
         server = uvicorn.Server(config)
 
-        # 在子进程中初始化并启动调度器
-        scheduler = BackgroundScheduler()
-        scheduler.add_job(self.clean_old_files, CronTrigger(hour=0, minute=0))
-        scheduler.add_job(self.update_index, CronTrigger(hour=0, minute=5), kwargs={"full_scan": True})
+        # 在子进程中初始化并启动调度器，每个分片按自己的计划独立扫描和清理，线程池保证分片之间互不阻塞
+        scheduler = BackgroundScheduler(
+            executors={"default": {"type": "threadpool", "max_workers": max(10, 2 * len(self.shards))}}
+        )
+        for shard in self.shards.values():
+            scheduler.add_job(shard.clean_old_files, CronTrigger(**shard.clean_schedule),
+                              id=f"clean:/{shard.prefix}")
+            scheduler.add_job(shard.update_index, CronTrigger(**shard.scan_schedule),
+                              id=f"scan:/{shard.prefix}", kwargs={"full_scan": True})
         scheduler.start()
 
         server.run()
@@ -386,6 +921,16 @@ Uvicorn 服务器：Uvicorn 服务器成功启动，并在指定的地址和端
 if __name__ == "__main__":
     # 创建静态文件服务器实例
     static_server = FileService(folder_path=r"D:\kend\tests", host="127.0.0.1", port=8000)
+    # 多个根目录挂载示例：
+    # static_server = FileService(
+    #     folder_path=r"D:\kend\tests",
+    #     host="127.0.0.1",
+    #     port=8000,
+    #     shards=[
+    #         IndexShard(r"E:\videos", prefix="videos", retention_days=30, scan_schedule={"hour": 1, "minute": 0}),
+    #         IndexShard(r"F:\archive", prefix="archive", retention_days=365, scan_schedule={"hour": 2, "minute": 0}),
+    #     ],
+    # )
 
     try:
         # 启动静态文件服务器
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/20 上午11:05
+@Author  : Kend
+@FileName: test_io_advice.py
+@Software: PyCharm
+@modifier:
+"""
+
+
+import io_advice
+from io_advice import AdvisedReader, iter_file, readahead_size
+
+
+def record_fadvise(monkeypatch):
+    calls = []
+    monkeypatch.setattr(io_advice, "fadvise", lambda fd, offset, length, advice: calls.append((offset, length, advice)))
+    return calls
+
+
+def test_readahead_size():
+    assert readahead_size("video/mp4") == io_advice.READAHEAD_SIZES["video/"]
+    assert readahead_size("image/png") == io_advice.READAHEAD_SIZES["image/"]
+    assert readahead_size(None) == io_advice.DEFAULT_READAHEAD_SIZE
+
+
+def test_iter_file_reads_range_and_closes(tmp_path, monkeypatch):
+    calls = record_fadvise(monkeypatch)
+    path = tmp_path / "a.bin"
+    path.write_bytes(bytes(range(256)) * 10)
+
+    file = open(path, 'rb')
+    data = b"".join(iter_file(file, 100, 1000, chunk_size=64, drop_cache=True))
+
+    assert data == (bytes(range(256)) * 10)[100:1100]
+    assert file.closed
+    assert calls[0][2] == "SEQUENTIAL"
+    assert calls[1] == (100, 2460, "WILLNEED")
+    assert calls[-1] == (100, 1000, "DONTNEED")
+
+
+def test_advised_reader_without_advice(tmp_path, monkeypatch):
+    calls = record_fadvise(monkeypatch)
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"0123456789")
+
+    reader = AdvisedReader(open(path, 'rb'), advise=False, drop_cache=True)
+    reader.seek(2)
+    assert reader.read(3) == b"234"
+    reader.close()
+    reader.close()
+
+    assert calls == []
@@ -0,0 +1,522 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/20 上午10:20
+@Author  : Kend
+@FileName: test_static_folder_server_enhance.py
+@Software: PyCharm
+@modifier:
+"""
+
+
+import asyncio
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+import io_advice
+import static_folder_server_enhance
+from static_folder_server_enhance import FileService, IndexShard, UPLOAD_PART_SUFFIX, UPLOAD_STATE_SUFFIX
+
+
+@pytest.fixture
+def service(tmp_path):
+    return FileService(folder_path=str(tmp_path), allow_upload=True)
+
+
+@pytest.fixture
+def client(service):
+    return TestClient(service.create_app())
+
+
+def test_upload_without_size(client, service, tmp_path):
+    response = client.put("/sub/new.txt", content=b"hello")
+    assert response.status_code == 201
+    assert response.json() == {"path": "sub/new.txt", "size": 5}
+    assert (tmp_path / "sub" / "new.txt").read_bytes() == b"hello"
+    assert service.index["sub/new.txt"]["size"] == 5
+    assert not os.path.exists(str(tmp_path / "sub" / "new.txt") + UPLOAD_PART_SUFFIX)
+
+
+def test_upload_resume(client, service, tmp_path):
+    response = client.put("/video.bin?size=10", content=b"12345")
+    assert response.status_code == 202
+    assert response.json() == {"offset": 5, "size": 10}
+    assert response.headers["Upload-Offset"] == "5"
+    assert not (tmp_path / "video.bin").exists()
+    assert "video.bin" not in service.index
+
+    response = client.put("/video.bin?offset=5", content=b"67890")
+    assert response.status_code == 201
+    assert (tmp_path / "video.bin").read_bytes() == b"1234567890"
+    assert service.index["video.bin"]["size"] == 10
+    assert not os.path.exists(str(tmp_path / "video.bin") + UPLOAD_STATE_SUFFIX)
+
+
+def test_upload_offset_mismatch(client, tmp_path):
+    client.put("/video.bin?size=10", content=b"12345")
+
+    response = client.put("/video.bin?offset=3&size=10", content=b"xx")
+    assert response.status_code == 409
+    assert response.json()["detail"]["offset"] == 5
+    assert response.headers["Upload-Offset"] == "5"
+
+    # 没有未完成的上传时不能从非零偏移开始
+    response = client.put("/other.bin?offset=3", content=b"xx")
+    assert response.status_code == 409
+
+
+def test_upload_exceeds_declared_size(client, tmp_path):
+    response = client.put("/small.bin?size=3", content=b"12345")
+    assert response.status_code == 413
+    assert not (tmp_path / "small.bin").exists()
+
+
+def test_upload_invalid_params(client):
+    assert client.put("/a.bin?offset=abc", content=b"x").status_code == 400
+    assert client.put("/a.bin?offset=5&size=3", content=b"x").status_code == 400
+
+
+@pytest.mark.parametrize("path", ["/index.json", "/a.bin" + UPLOAD_PART_SUFFIX, "/a.bin" + UPLOAD_STATE_SUFFIX])
+def test_upload_reserved_names(client, path):
+    assert client.put(path, content=b"x").status_code == 403
+
+
+def test_upload_to_directory(client, tmp_path):
+    (tmp_path / "dir").mkdir()
+    assert client.put("/dir", content=b"x").status_code == 409
+
+
+def test_upload_under_file(client, tmp_path):
+    (tmp_path / "a.mkv").write_bytes(b"x")
+    assert client.put("/a.mkv/sub", content=b"x").status_code == 409
+
+
+def test_upload_disabled_by_default(tmp_path):
+    client = TestClient(FileService(folder_path=str(tmp_path)).create_app())
+    assert client.put("/a.txt", content=b"x").status_code == 405
+    assert not (tmp_path / "a.txt").exists()
+
+
+def test_upload_overwrite(client, tmp_path):
+    (tmp_path / "a.txt").write_bytes(b"old")
+
+    response = client.put("/a.txt", content=b"new")
+    assert response.status_code == 409
+    assert (tmp_path / "a.txt").read_bytes() == b"old"
+
+    response = client.put("/a.txt?overwrite=true", content=b"new")
+    assert response.status_code == 201
+    assert (tmp_path / "a.txt").read_bytes() == b"new"
+
+
+def test_upload_target_created_during_upload(client, tmp_path):
+    assert client.put("/a.bin?size=6", content=b"123").status_code == 202
+    (tmp_path / "a.bin").write_bytes(b"other")
+
+    # 目标已存在，续传也需要 overwrite=true
+    assert client.put("/a.bin?offset=3", content=b"456").status_code == 409
+    response = client.put("/a.bin?offset=3&overwrite=true", content=b"456")
+    assert response.status_code == 201
+    assert (tmp_path / "a.bin").read_bytes() == b"123456"
+
+
+def test_upload_target_created_while_streaming(client, service, tmp_path):
+    app = service.create_app()
+    messages = [
+        {"type": "http.request", "body": b"abc", "more_body": True},
+        {"type": "http.request", "body": b"def", "more_body": False},
+    ]
+    sent = []
+
+    async def receive():
+        if len(messages) == 1:
+            (tmp_path / "race.bin").write_bytes(b"other")  # 请求体传输期间目标文件被创建
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "PUT",
+        "scheme": "http", "path": "/race.bin", "raw_path": b"/race.bin", "root_path": "",
+        "query_string": b"", "headers": [], "client": ("test", 1), "server": ("test", 80),
+    }
+    asyncio.run(app(scope, receive, send))
+
+    assert sent[0]["status"] == 409
+    assert (tmp_path / "race.bin").read_bytes() == b"other"
+
+    response = client.put("/race.bin?offset=6&overwrite=true", content=b"")
+    assert response.status_code == 201
+    assert (tmp_path / "race.bin").read_bytes() == b"abcdef"
+
+def test_upload_disconnect_is_not_committed(service, tmp_path):
+    (tmp_path / "trunc.bin").write_bytes(b"good file")
+    app = service.create_app()
+
+    messages = [{"type": "http.request", "body": b"partial", "more_body": True}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "PUT",
+        "scheme": "http", "path": "/trunc.bin", "raw_path": b"/trunc.bin", "root_path": "",
+        "query_string": b"overwrite=true", "headers": [], "client": ("test", 1), "server": ("test", 80),
+    }
+    asyncio.run(app(scope, receive, send))
+
+    assert sent[0]["status"] == 202
+    assert (tmp_path / "trunc.bin").read_bytes() == b"good file"
+    with open(str(tmp_path / "trunc.bin") + UPLOAD_STATE_SUFFIX, encoding="utf-8") as f:
+        assert json.load(f)["offset"] == 7
+
+
+def test_upload_during_scan_is_kept(client, service, monkeypatch):
+    walk = os.walk
+
+    def walk_with_upload(top, *args, **kwargs):
+        # 根目录列出之后才上传到新的子目录，扫描本身看不到这个文件
+        for i, item in enumerate(walk(top, *args, **kwargs)):
+            yield item
+            if i == 0:
+                assert client.put("/late/up.txt", content=b"x").status_code == 201
+
+    monkeypatch.setattr(os, "walk", walk_with_upload)
+    service.update_index(full_scan=True)
+
+    assert "late/up.txt" in service.index
+    with open(os.path.join(service.folder_path, "index.json"), encoding="utf-8") as f:
+        assert os.path.join("late", "up.txt") in json.load(f)
+
+
+def test_clean_during_scan_is_kept(service, tmp_path, monkeypatch):
+    (tmp_path / "old.bin").write_bytes(b"x")
+    os.utime(tmp_path / "old.bin", (0, 0))
+    shard = service.shards[""]
+    walk = os.walk
+
+    def walk_with_clean(top, *args, **kwargs):
+        # 扫描已经记录 old.bin 之后才清理
+        for i, item in enumerate(walk(top, *args, **kwargs)):
+            yield item
+            if i == 0:
+                shard.clean_old_files()
+
+    monkeypatch.setattr(os, "walk", walk_with_clean)
+    service.update_index(full_scan=True)
+
+    assert not (tmp_path / "old.bin").exists()
+    assert "old.bin" not in service.index
+    with open(tmp_path / "index.json", encoding="utf-8") as f:
+        assert "old.bin" not in json.load(f)
+    assert not shard.removed_during_scan
+
+
+def test_scan_skips_vanished_files(service, tmp_path, monkeypatch):
+    (tmp_path / "gone.bin").write_bytes(b"x")
+    (tmp_path / "kept.bin").write_bytes(b"x")
+    walk = os.walk
+
+    def walk_then_delete(top, *args, **kwargs):
+        # 目录列出之后、读取文件信息之前删除文件
+        for item in walk(top, *args, **kwargs):
+            if (tmp_path / "gone.bin").exists():
+                os.remove(tmp_path / "gone.bin")
+            yield item
+
+    monkeypatch.setattr(os, "walk", walk_then_delete)
+    service.update_index(full_scan=True)
+
+    assert "gone.bin" not in service.index
+    assert "kept.bin" in service.index
+
+
+def test_search_escapes_file_names(client):
+    name = '"><script>alert(1)<'
+    assert client.put(f"/{name}.txt", content=b"x").status_code == 201
+
+    response = client.get("/?search=script")
+    assert response.status_code == 200
+    assert "<script>" not in response.text
+    assert "&lt;script&gt;" in response.text
+    assert 'href="/%22%3E%3Cscript%3Ealert%281%29%3C.txt"' in response.text
+
+
+def test_directory_listing_escapes_file_names(client):
+    assert client.put("/<img src=x onerror=alert(1)>.jpg", content=b"x").status_code == 201
+
+    response = client.get("/")
+    assert response.status_code == 200
+    assert "<img" not in response.text
+    assert "&lt;img src=x onerror=alert(1)&gt;.jpg" in response.text
+
+
+@pytest.mark.parametrize("io_advice", [True, False])
+def test_download_keeps_file_response_semantics(tmp_path, io_advice):
+    content = bytes(range(256)) * 800
+    (tmp_path / "a.mkv").write_bytes(content)
+    client = TestClient(FileService(folder_path=str(tmp_path), io_advice=io_advice).create_app())
+
+    response = client.get("/a.mkv")
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert "ETag" in response.headers
+    assert "Last-Modified" in response.headers
+
+    response = client.get("/a.mkv", headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.content == content[:10]
+    assert response.headers["Content-Range"] == f"bytes 0-9/{len(content)}"
+
+    etag = response.headers["ETag"]
+    response = client.get("/a.mkv", headers={"Range": "bytes=10-19", "If-Range": etag})
+    assert response.status_code == 206
+    assert response.content == content[10:20]
+
+    response = client.get("/a.mkv", headers={"Range": "bytes=10-19", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == content
+
+
+@pytest.mark.parametrize("io_advice", [True, False])
+def test_mp4_range(tmp_path, io_advice):
+    content = bytes(range(256)) * 100
+    (tmp_path / "v.mp4").write_bytes(content)
+    client = TestClient(FileService(folder_path=str(tmp_path), io_advice=io_advice).create_app())
+
+    response = client.get("/v.mp4", headers={"Range": "bytes=100-"})
+    assert response.status_code == 206
+    assert response.content == content[100:]
+    assert response.headers["Content-Range"] == f"bytes 100-{len(content) - 1}/{len(content)}"
+
+
+@pytest.fixture
+def roots(tmp_path):
+    paths = {}
+    for name in ("root", "media", "videos"):
+        paths[name] = tmp_path / name
+        paths[name].mkdir()
+        (paths[name] / f"{name}.txt").write_bytes(name.encode())
+    return paths
+
+
+@pytest.fixture
+def multi_service(roots):
+    return FileService(folder_path=str(roots["root"]), shards=[
+        IndexShard(str(roots["media"]), prefix="media"),
+        IndexShard(str(roots["videos"]), prefix="/media/videos/"),
+    ])
+
+
+def test_find_shard_longest_prefix(multi_service):
+    assert multi_service.find_shard("media/videos/a.mp4") == (multi_service.shards["media/videos"], "a.mp4")
+    assert multi_service.find_shard("media/videos") == (multi_service.shards["media/videos"], "")
+    assert multi_service.find_shard("media/videos2/a") == (multi_service.shards["media"], "videos2/a")
+    assert multi_service.find_shard("other/a") == (multi_service.shards[""], "other/a")
+
+
+def test_duplicate_prefix(roots):
+    with pytest.raises(ValueError):
+        FileService(shards=[IndexShard(str(roots["media"]), "m"), IndexShard(str(roots["videos"]), "/m")])
+    with pytest.raises(ValueError):
+        FileService()
+
+
+def test_multi_root_routing_and_index(multi_service):
+    client = TestClient(multi_service.create_app())
+    assert client.get("/root.txt").content == b"root"
+    assert client.get("/media/media.txt").content == b"media"
+    assert client.get("/media/videos/videos.txt").content == b"videos"
+    assert client.get("/media/videos.txt").status_code == 404
+
+    assert sorted(multi_service.index) == ["media/media.txt", "media/videos/videos.txt", "root.txt"]
+
+    response = client.get("/media")
+    assert 'href="/media/videos"' in response.text
+    assert 'href="/media/media.txt"' in response.text
+
+
+def test_virtual_mount_points(roots):
+    service = FileService(shards=[IndexShard(str(roots["videos"]), prefix="x/y")])
+    client = TestClient(service.create_app())
+
+    assert service.folder_path is None
+    assert 'href="/x"' in client.get("/").text
+    assert 'href="/x/y"' in client.get("/x").text
+    assert 'href="/x/y/videos.txt"' in client.get("/x/y").text
+    assert client.get("/x/y/videos.txt").content == b"videos"
+    assert client.get("/nope").status_code == 404
+    assert client.get("/x/nope").status_code == 404
+
+
+def test_search_across_shards(multi_service, roots):
+    (roots["videos"] / "clip.mp4").write_bytes(b"x")
+    (roots["media"] / "clip.txt").write_bytes(b"x")
+    multi_service.update_index(full_scan=True)
+    client = TestClient(multi_service.create_app())
+
+    response = client.get("/?search=CLIP")
+    assert 'href="/media/videos/clip.mp4"' in response.text
+    assert 'href="/media/clip.txt"' in response.text
+
+    response = client.get("/media/videos?search=clip")
+    assert 'href="/media/videos/clip.mp4"' in response.text
+    assert 'href="/media/clip.txt"' not in response.text
+
+
+def test_failing_shard_does_not_stop_others(multi_service, roots, monkeypatch):
+    def fail(full_scan=False):
+        raise OSError("volume offline")
+
+    monkeypatch.setattr(multi_service.shards["media"], "update_index", fail)
+    (roots["videos"] / "new.txt").write_bytes(b"x")
+    (roots["root"] / "new.txt").write_bytes(b"x")
+    multi_service.update_index(full_scan=True)
+
+    assert "media/videos/new.txt" in multi_service.index
+    assert "new.txt" in multi_service.index
+
+
+def test_start_server_schedules_each_shard(roots, monkeypatch):
+    jobs = {}
+
+    class FakeScheduler:
+        def __init__(self, executors):
+            self.executors = executors
+
+        def add_job(self, func, trigger, id, kwargs=None):
+            jobs[id] = (func, str(trigger), kwargs)
+
+        def start(self):
+            pass
+
+    monkeypatch.setattr(static_folder_server_enhance, "BackgroundScheduler", FakeScheduler)
+    monkeypatch.setattr(static_folder_server_enhance.uvicorn.Server, "run", lambda self: None)
+    service = FileService(folder_path=str(roots["root"]), shards=[
+        IndexShard(str(roots["videos"]), prefix="videos", scan_schedule={"hour": 1, "minute": 30},
+                   clean_schedule={"hour": 2, "minute": 0}),
+    ])
+    service.start_server()
+
+    videos = service.shards["videos"]
+    assert jobs["scan:/videos"] == (videos.update_index, "cron[hour='1', minute='30']", {"full_scan": True})
+    assert jobs["clean:/videos"] == (videos.clean_old_files, "cron[hour='2', minute='0']", None)
+    assert jobs["scan:/"][1] == "cron[hour='0', minute='5']"
+    assert jobs["clean:/"][1] == "cron[hour='0', minute='0']"
+
+
+def test_clean_expires_paused_upload_together(client, service, tmp_path):
+    assert client.put("/p.bin?size=10", content=b"123").status_code == 202
+    part = str(tmp_path / "p.bin") + UPLOAD_PART_SUFFIX
+    state = str(tmp_path / "p.bin") + UPLOAD_STATE_SUFFIX
+    os.utime(part, (0, 0))
+    os.utime(state, (0, 0))
+
+    service.clean_old_files()
+    assert not os.path.exists(part)
+    assert not os.path.exists(state)
+
+    # 重新上传不会被残留的状态文件拦住
+    assert client.put("/p.bin?size=3", content=b"abc").status_code == 201
+
+
+def test_clean_keeps_active_upload_state(client, service, tmp_path):
+    assert client.put("/p.bin?size=10", content=b"123").status_code == 202
+    state = str(tmp_path / "p.bin") + UPLOAD_STATE_SUFFIX
+    os.utime(state, (0, 0))
+
+    service.clean_old_files()
+    assert os.path.exists(state)
+    assert client.put("/p.bin?offset=3", content=b"4567890").status_code == 201
+
+
+@pytest.mark.parametrize("request_headers", [
+    {},
+    {"Range": "bytes=0-9"},
+    {"Range": "bytes=100-"},
+    {"Range": "bytes=-10"},
+    {"Range": "bytes=0-99999999"},
+    {"Range": "bytes=999999-"},
+    {"Range": "bytes=10-19", "If-Range": '"stale"'},
+])
+def test_advised_download_matches_file_response(tmp_path, request_headers):
+    content = bytes(range(256)) * 800
+    (tmp_path / "a.mkv").write_bytes(content)
+    responses = [
+        TestClient(FileService(folder_path=str(tmp_path), io_advice=io_advice).create_app()).get(
+            "/a.mkv", headers=dict(request_headers, **{"Accept-Encoding": "identity"}))
+        for io_advice in (True, False)
+    ]
+    advised, plain = responses
+
+    assert advised.status_code == plain.status_code
+    assert advised.content == plain.content
+    for name in ("ETag", "Last-Modified", "Accept-Ranges", "Content-Range", "Content-Length"):
+        assert advised.headers.get(name) == plain.headers.get(name)
+
+
+def test_advised_download_ignores_multiple_ranges(tmp_path):
+    # 多段范围按 RFC 9110 可以忽略，返回完整内容
+    content = bytes(range(256)) * 800
+    (tmp_path / "a.mkv").write_bytes(content)
+    client = TestClient(FileService(folder_path=str(tmp_path)).create_app())
+
+    response = client.get("/a.mkv", headers={"Range": "bytes=0-1,5-6"})
+    assert response.status_code == 200
+    assert response.content == content
+
+
+def record_fadvise(monkeypatch):
+    calls = []
+    monkeypatch.setattr(io_advice, "fadvise", lambda fd, offset, length, advice: calls.append(advice))
+    monkeypatch.setattr(static_folder_server_enhance, "fadvise", lambda fd, offset, length, advice: calls.append(advice))
+    return calls
+
+
+def test_download_issues_fadvise(tmp_path, monkeypatch):
+    calls = record_fadvise(monkeypatch)
+    monkeypatch.setattr(static_folder_server_enhance, "LARGE_FILE_THRESHOLD", 4096)
+    (tmp_path / "small.bin").write_bytes(b"x" * 4095)
+    (tmp_path / "large.bin").write_bytes(b"x" * 4096)
+    client = TestClient(FileService(folder_path=str(tmp_path)).create_app())
+
+    assert client.get("/small.bin").status_code == 200
+    assert calls[:2] == ["SEQUENTIAL", "WILLNEED"]
+    assert "DONTNEED" not in calls
+
+    calls.clear()
+    assert client.get("/large.bin").status_code == 200
+    assert calls[:2] == ["SEQUENTIAL", "WILLNEED"]
+    assert calls[-1] == "DONTNEED"
+
+    # 范围请求之后可能还会读取同一范围，不释放页缓存
+    calls.clear()
+    assert client.get("/large.bin", headers={"Range": "bytes=0-"}).status_code == 206
+    assert "DONTNEED" not in calls
+
+
+def test_download_without_io_advice_issues_no_fadvise(tmp_path, monkeypatch):
+    calls = record_fadvise(monkeypatch)
+    (tmp_path / "a.bin").write_bytes(b"x" * 100)
+    client = TestClient(FileService(folder_path=str(tmp_path), io_advice=False).create_app())
+
+    assert client.get("/a.bin").status_code == 200
+    assert calls == []
+
+
+def test_large_upload_drops_cache(tmp_path, monkeypatch):
+    calls = record_fadvise(monkeypatch)
+    monkeypatch.setattr(static_folder_server_enhance, "LARGE_FILE_THRESHOLD", 4096)
+    client = TestClient(FileService(folder_path=str(tmp_path), allow_upload=True).create_app())
+
+    assert client.put("/small.bin", content=b"x" * 4095).status_code == 201
+    assert calls == []
+    assert client.put("/large.bin", content=b"x" * 4096).status_code == 201
+    assert calls == ["DONTNEED"]